@@ -258,7 +258,9 @@ class JART_TUD_memristor:
 #######################################################################
 # 2. Functional Programming approach
 #######################################################################
-def Imem(V_m, Ndisc, rvar=45e-9, lvar=0.4):
+def Imem(V_m, Ndisc, rvar=45e-9, lvar=0.4, dtype=None):
+    if dtype is not None:   # Reduced-precision evaluation (see section 5)
+        return Imem_lowp(V_m, Ndisc, rvar, lvar, dtype)
     return np.where(V_m < 0, 
                     Imem_neg(V_m, Ndisc, rvar, lvar), 
                     Imem_pos(V_m, Ndisc, rvar, lvar))
@@ -296,7 +298,9 @@ def dNdisc_dt(V_m, Ndisc, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20):
             return Ndisc_update
 
 
-def dNdisc_dt_test(V_m, Ndisc, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20):
+def dNdisc_dt_test(V_m, Ndisc, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20, dtype=None, coupling=None):
+    if dtype is not None:   # Reduced-precision evaluation (see section 5)
+        return dNdisc_dt_lowp(V_m, Ndisc, rvar, lvar, Ndiscmin, Ndiscmax, dtype, coupling)
 
     cond_nan = (Ndisc < Ndiscmin * (1 - 1e-8)) | (Ndisc > Ndiscmax * (1 + 1e-8))
     I_mem = Imem(V_m, Ndisc, rvar, lvar)
@@ -318,6 +322,9 @@ def dNdisc_dt_test(V_m, Ndisc, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20)
     dWamin = dWa * e * (np.sqrt(1 - gamma ** 2) - gamma * np.pi / 2 + gamma * np.arcsin(gamma))
     dWamax = dWa * e * (np.sqrt(1 - gamma ** 2) + gamma * np.pi / 2 + gamma * np.arcsin(gamma))
     T = I_mem * (V_m - Vseries) * Rtheff + T0
+    if coupling is not None:    # Thermal crosstalk in device arrays, Eq. (6)
+        dT = T - T0
+        T = T + coupling @ np.where(np.isfinite(dT), dT, 0)     # NaN devices (Ndisc<=0) do not heat their neighbours
     I_ion = zvo * e * cvo * a * ny0 * A * (
                 np.exp(-dWamin / (kb * T)) - np.exp(-dWamax / (kb * T))) * Flim
     Ndisc_update = -I_ion / (A * lvar * 1e-9 * e * zvo) / 1e26
@@ -435,6 +442,583 @@ def Imem_pos(V_m, Ndisc, rvar=45e-9, lvar=0.4):
     return np.where(V_m<0, np.nan, I_mem)
 
 
+#######################################################################
+# 3. Model calibration (fitting of the p_X,Y coefficients)
+#######################################################################
+# Every p_X,Y term is linear in the fitting coefficients of the JART_TUD_params file:
+#
+#           p_X,Y = sum_k c_k * b_k(d_r,d_l)           (3)
+#
+# where b_k is one of the basis functions {1, d_r, d_l, d_r^2, d_r*d_l, d_r^2*d_l}.
+# The tables below map each coefficient c_k to its p_X,Y term and its basis function.
+# With these, Imem and its analytic Jacobian w.r.t. all the coefficients are evaluated
+# for a complete I-V dataset in a single vectorized call. Samples of several devices
+# are simply concatenated (each sample carries its own rvar and lvar).
+#
+# - The calibration data (V_m, Ndisc, I_meas, rvar, lvar) are 1D arrays of equal length
+# - The negative (V_m<=0) and the positive (V_m>=0) branches are fitted separately
+# - The fitted coefficients can be loaded with calib_load() and are then used by all the model functions
+
+calib_map_neg = (   # (coefficient, p_X,Y term, basis function)
+    ('p1_0_n', 'p1_0', '1'), ('Dp1_0_r_n', 'p1_0', 'r'), ('Dp1_0_l_n', 'p1_0', 'l'),
+    ('p1_1_n', 'p1_1', '1'), ('Dp1_1_r_n', 'p1_1', 'r'), ('Dp1_1_l_n', 'p1_1', 'l'),
+    ('p1_2_n', 'p1_2', '1'), ('Dp1_2_r_n', 'p1_2', 'r'), ('Dp1_2_l_n', 'p1_2', 'l'),
+    ('p1_3_n', 'p1_3', '1'), ('Dp1_3_r_n', 'p1_3', 'r'), ('Dp1_3_l_n', 'p1_3', 'l'),
+    ('p1_4_n', 'p1_4', '1'), ('Dp1_4_r_n', 'p1_4', 'r'), ('Dp1_4_l_n', 'p1_4', 'l'),
+    ('p2_0_n', 'p2_0', '1'),
+    ('p3_0_n', 'p3_0', '1'), ('Dp3_0_r_n', 'p3_0', 'r'), ('Dp3_0_l_n', 'p3_0', 'l'),
+    ('p3_1_n', 'p3_1', '1'), ('Dp3_1_r_n', 'p3_1', 'r'), ('Dp3_1_l_n', 'p3_1', 'l'),
+    ('p4_0_n', 'p4_0', '1'),
+    ('p4_1_n', 'p4_1', '1'), ('Dp4_1_r_n', 'p4_1', 'r'), ('Dp4_1_l_n', 'p4_1', 'l'),
+    ('p4_2_n', 'p4_2', '1'),
+    ('p5_1_n', 'p5_1', '1'), ('Dp5_1_r_n', 'p5_1', 'r'), ('Dp5_1_l_n', 'p5_1', 'l'),
+    ('p5_2_n', 'p5_2', '1'), ('Dp5_2_r_n', 'p5_2', 'r'), ('Dp5_2_r2_n', 'p5_2', 'r2'),
+    ('p7_0_n', 'p7_0', '1'), ('Dp7_0_r_n', 'p7_0', 'r'), ('Dp7_0_l_n', 'p7_0', 'l'),
+    ('p9_0_n', 'p9_0', '1'), ('Dp9_0_r_n', 'p9_0', 'r'), ('Dp9_0_l_n', 'p9_0', 'l'),
+    ('p9_1_n', 'p9_1', '1'),
+    ('p9_2_n', 'p9_2', '1'),
+    ('p9_3_n', 'p9_3', '1'), ('Dp9_3_r_n', 'p9_3', 'r'),
+    ('p10_0_n', 'p10_0', '1'),
+    ('p10_1_n', 'p10_1', '1'), ('Dp10_1_r_n', 'p10_1', 'r'),
+    ('p10_2_n', 'p10_2', '1'),
+    ('p10_3_n', 'p10_3', '1'),
+    ('p11_0_n', 'p11_0', '1'), ('Dp11_0_r_n', 'p11_0', 'r'),
+    ('p11_1_n', 'p11_1', '1'),
+    ('p11_2_n', 'p11_2', '1'),
+    ('p11_3_n', 'p11_3', '1'),
+)
+
+calib_map_pos = (   # (coefficient, p_X,Y term, basis function)
+    ('p5_1_p', 'p5_1', '1'), ('Dp5_1_r_p', 'p5_1', 'r'), ('Dp5_1_l_p', 'p5_1', 'l'),      # p5_0=p5_1 in [1]
+    ('p5_2_p', 'p5_2', '1'),
+    ('p6_0_p', 'p6_0', '1'), ('Dp6_0_r_p', 'p6_0', 'r'),
+    ('p6_1_p', 'p6_1', '1'),
+    ('p7_0_p', 'p7_0', '1'), ('Dp7_0_r_p', 'p7_0', 'r'), ('Dp7_0_r2_p', 'p7_0', 'r2'), ('Dp7_0_l_p', 'p7_0', 'l'),
+    ('p7_1_p', 'p7_1', '1'),
+    ('p7_2_p', 'p7_2', '1'), ('Dp7_2_r_p', 'p7_2', 'r'), ('Dp7_2_r2_p', 'p7_2', 'r2'),
+    ('Dp7_2_l_p', 'p7_2', 'l'), ('Dp7_2_l_r_p', 'p7_2', 'rl'), ('Dp7_2_l_r2_p', 'p7_2', 'r2l'),  #Special case: Dp7_2_l dependency to d_r
+    ('p7_3_p', 'p7_3', '1'),
+    ('p8_0_p', 'p8_0', '1'), ('Dp8_0_l_p', 'p8_0', 'l'),
+    ('p8_1_p', 'p8_1', '1'),
+    ('p10_0_p', 'p10_0', '1'), ('Dp10_0_l_p', 'p10_0', 'l'),
+    ('p10_1_p', 'p10_1', '1'),
+    ('p10_2_p', 'p10_2', '1'),
+    ('p11_0_p', 'p11_0', '1'), ('Dp11_0_l_p', 'p11_0', 'l'),
+    ('p11_1_p', 'p11_1', '1'),
+    ('p11_2_p', 'p11_2', '1'),
+)
+
+def calib_map(branch):
+    if branch == 'neg':
+        return calib_map_neg
+    elif branch == 'pos':
+        return calib_map_pos
+    raise NameError("Invalid branch. Please insert a valid branch argument (neg / pos)!")
+
+def calib_names(branch):
+    return [name for name, _, _ in calib_map(branch)]
+
+def calib_coefs(branch):
+    # Current values of the coefficients (ie. the values of the JART_TUD_params file, or the last loaded ones)
+    return np.array([globals()[name] for name in calib_names(branch)], dtype=float)
+
+def calib_load(c, branch):
+    # Replace the coefficients used by all the model functions (OOP and functional approach)
+    globals().update(zip(calib_names(branch), (float(c_k) for c_k in c)))
+
+
+def _calib_pXY(c, d_r, d_l, cmap):
+    basis = {'1': np.ones_like(d_r), 'r': d_r, 'l': d_l, 'r2': d_r**2, 'rl': d_r*d_l, 'r2l': (d_r**2)*d_l}
+    B = np.stack([basis[b] for _, _, b in cmap], axis=-1)      # dp_X,Y/dc_k = b_k (Eq. 3)
+    pXY = {}
+    for k, (_, term, _) in enumerate(cmap):
+        pXY[term] = pXY.get(term, 0.0) + c[k]*B[:, k]
+    return pXY, B
+
+def _calib_glf(L, p5, p6, p7, p8, p9, p10, p11):
+    # Generalized logistic function part: I = p5/(p6 + p7*(p8*exp(L-p9))**(-p10))**(1/p11)
+    Q = np.log(p8) + L - p9
+    G = np.exp(-p10*Q)
+    D = p6 + p7*G
+    I_glf = p5 * D**(-1./p11)
+    dI_dD = -I_glf / (p11*D)
+    dI = {'p5': D**(-1./p11),
+          'p6': dI_dD,
+          'p7': dI_dD*G,
+          'p8': dI_dD*p7*G*(-p10/p8),
+          'p9': dI_dD*p7*G*p10,
+          'p10': dI_dD*p7*G*(-Q),
+          'p11': I_glf*np.log(D)/(p11**2)}
+    return I_glf, dI
+
+def _calib_sigmoid(V_m, y_0, y_1, y_2, y_3):
+    # y = y_0 + (y_1-y_0)/(1+exp((V_m-y_2)/y_3)) and its partial derivatives
+    u = (V_m - y_2)/y_3
+    s = 1/(1 + np.exp(u))
+    dy_du = -(y_1 - y_0)*s*(1 - s)
+    return y_0 + (y_1 - y_0)*s, (1 - s, s, -dy_du/y_3, -dy_du*u/y_3)
+
+def _calib_inputs(V_m, Ndisc, rvar, lvar):
+    return np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float)) for x in (V_m, Ndisc, rvar, lvar)))
+
+def Imem_neg_grad(V_m, Ndisc, rvar=45e-9, lvar=0.4, c=None):
+    # Returns Imem_neg and its Jacobian dImem_neg/dc (rows: samples, columns: coefficients of calib_map_neg)
+    V_m, Ndisc, rvar, lvar = _calib_inputs(V_m, Ndisc, rvar, lvar)
+    c = calib_coefs('neg') if c is None else np.asarray(c, dtype=float)
+    d_r = (rvar - rdet) / (delta_r * rdet)     #Eq.(16) in [1]
+    d_l = (lvar - ldet) / (delta_l * ldet)     #Eq.(16) in [1]
+    P, B = _calib_pXY(c, d_r, d_l, calib_map_neg)
+    L = np.log(Ndisc/Ndmin)
+    
+    # Calculate p_X parameters for V_m<0 (ie. voltage dependence) and dp_X/dp_X,Y
+    num = P['p1_1']*V_m + P['p1_2']*(V_m**2)
+    den = 1 + P['p1_3']*V_m + P['p1_4']*(V_m**2)
+    p1 = P['p1_0']*num/den
+    p2 = P['p2_0']
+    p3 = P['p3_0'] + P['p3_1']*V_m
+    E4 = np.exp(-P['p4_2']*V_m)
+    p4 = P['p4_0'] - P['p4_1']*E4
+    p5 = P['p5_1']*V_m + P['p5_2']*(V_m**2)
+    p9, dp9 = _calib_sigmoid(V_m, P['p9_0'], P['p9_1'], P['p9_2'], P['p9_3'])
+    p10, dp10 = _calib_sigmoid(V_m, P['p10_0'], P['p10_1'], P['p10_2'], P['p10_3'])
+    h11, dh11 = _calib_sigmoid(V_m, P['p11_0'], P['p11_1'], P['p11_2'], P['p11_3'])
+    p11 = 1/h11
+    
+    # ExpLin part
+    A = L - p3
+    E = np.exp(A/p4)
+    I_mem = p1*(p2*(E - 1) + A)
+    dI_dp1 = p2*(E - 1) + A
+    dI_dp3 = -p1*(p2*E/p4 + 1)
+    dI_dp4 = -p1*p2*E*A/(p4**2)
+    # Generalized logistic function part (p6=p8=1)
+    I_glf, dI = _calib_glf(L, p5, 1, P['p7_0'], 1, p9, p10, p11)
+    I_mem = I_mem + I_glf
+    dI_dp11 = -dI['p11']*(p11**2)
+    
+    dI_dpXY = {
+        'p1_0': dI_dp1*num/den,
+        'p1_1': dI_dp1*P['p1_0']*V_m/den,
+        'p1_2': dI_dp1*P['p1_0']*(V_m**2)/den,
+        'p1_3': -dI_dp1*p1*V_m/den,
+        'p1_4': -dI_dp1*p1*(V_m**2)/den,
+        'p2_0': p1*(E - 1),
+        'p3_0': dI_dp3,
+        'p3_1': dI_dp3*V_m,
+        'p4_0': dI_dp4,
+        'p4_1': -dI_dp4*E4,
+        'p4_2': dI_dp4*P['p4_1']*V_m*E4,
+        'p5_1': dI['p5']*V_m,
+        'p5_2': dI['p5']*(V_m**2),
+        'p7_0': dI['p7'],
+    }
+    for name, dI_dp, dp in (('p9', dI['p9'], dp9), ('p10', dI['p10'], dp10), ('p11', dI_dp11, dh11)):
+        for Y in range(4):
+            dI_dpXY[f'{name}_{Y}'] = dI_dp*dp[Y]
+    
+    J = B * np.stack([dI_dpXY[term] for _, term, _ in calib_map_neg], axis=-1)
+    out = (V_m > 0) | (Ndisc <= 0)
+    return np.where(out, np.nan, I_mem), np.where(out[:, None], np.nan, J)
+
+def Imem_pos_grad(V_m, Ndisc, rvar=45e-9, lvar=0.4, c=None):
+    # Returns Imem_pos and its Jacobian dImem_pos/dc (rows: samples, columns: coefficients of calib_map_pos)
+    V_m, Ndisc, rvar, lvar = _calib_inputs(V_m, Ndisc, rvar, lvar)
+    c = calib_coefs('pos') if c is None else np.asarray(c, dtype=float)
+    d_r = (rvar - rdet) / (delta_r * rdet)     #Eq.(16) in [1]
+    d_l = (lvar - ldet) / (delta_l * ldet)     #Eq.(16) in [1]
+    P, B = _calib_pXY(c, d_r, d_l, calib_map_pos)
+    L = np.log(Ndisc/Ndmin)
+    
+    # Calculate p_X parameters for V_m>0 (ie. voltage dependence), p1=0 cancels the ExpLin part
+    E5 = np.exp(-P['p5_2']*V_m)
+    E7 = np.exp(-P['p7_3']*V_m)
+    p5 = P['p5_1']*(1 - E5)                                         #Eq.(12) in [1] with p5_0=p5_1
+    p6 = P['p6_0'] + P['p6_1']*V_m
+    p7 = P['p7_0'] + P['p7_1']*V_m + P['p7_2']*E7                   #Eq.(7) in [1]
+    p8 = P['p8_0'] + P['p8_1']*V_m
+    p10 = P['p10_0'] + P['p10_1']*V_m + P['p10_2']*(V_m**2)
+    p11 = P['p11_0'] + P['p11_1']*V_m + P['p11_2']*(V_m**2)
+    I_mem, dI = _calib_glf(L, p5, p6, p7, p8, 0, p10, p11)
+    
+    dI_dpXY = {
+        'p5_1': dI['p5']*(1 - E5),
+        'p5_2': dI['p5']*P['p5_1']*V_m*E5,
+        'p6_0': dI['p6'],
+        'p6_1': dI['p6']*V_m,
+        'p7_0': dI['p7'],
+        'p7_1': dI['p7']*V_m,
+        'p7_2': dI['p7']*E7,
+        'p7_3': -dI['p7']*P['p7_2']*V_m*E7,
+        'p8_0': dI['p8'],
+        'p8_1': dI['p8']*V_m,
+    }
+    for name in ('p10', 'p11'):
+        for Y in range(3):
+            dI_dpXY[f'{name}_{Y}'] = dI[name]*(V_m**Y)
+    
+    J = B * np.stack([dI_dpXY[term] for _, term, _ in calib_map_pos], axis=-1)
+    out = (V_m < 0) | (Ndisc <= 0)
+    return np.where(out, np.nan, I_mem), np.where(out[:, None], np.nan, J)
+
+
+def calib_residuals(c, V_m, Ndisc, I_meas, rvar=45e-9, lvar=0.4, branch='neg', I_floor=1e-12):
+    # Relative residuals (log-like over the decades of the I-V curve) and their Jacobian w.r.t. c
+    if branch == 'neg':
+        Imem_grad = Imem_neg_grad
+    elif branch == 'pos':
+        Imem_grad = Imem_pos_grad
+    else:
+        raise NameError("Invalid branch. Please insert a valid branch argument (neg / pos)!")
+    I_mem, J = Imem_grad(V_m, Ndisc, rvar, lvar, c)
+    w = 1 / (np.abs(I_meas) + I_floor)
+    return (I_mem - I_meas)*w, J*w[:, None]
+
+
+class _calib_problem:
+    # Caches the last evaluation, since least_squares calls fun and jac at the same point
+    def __init__(self, c0, free, data, branch, I_floor):
+        self.c = np.array(c0, dtype=float)
+        self.free = free
+        self.data = data
+        self.branch = branch
+        self.I_floor = I_floor
+        self.x = None
+    
+    def eval(self, x):
+        if self.x is None or not np.array_equal(x, self.x):
+            self.c[self.free] = x
+            self.res, J = calib_residuals(self.c, *self.data, branch=self.branch, I_floor=self.I_floor)
+            self.jac = J[:, self.free]
+            self.x = np.array(x)
+        return self.res, self.jac
+    
+    def fun(self, x):
+        return self.eval(x)[0]
+    
+    def jac_fun(self, x):
+        return self.eval(x)[1]
+
+_calib_shared = {}   # Fit setup of the current (worker) process, see _calib_fit_init
+
+def _calib_fit_init(c0, free, data, branch, I_floor, lsq_kwargs):
+    # Initializer of the worker processes: the dataset is sent once per worker, not once per starting point
+    _calib_shared.update(c0=c0, free=free, data=data, branch=branch, I_floor=I_floor, lsq_kwargs=lsq_kwargs)
+
+def _calib_fit_start(x0):
+    from scipy.optimize import least_squares
+    s = _calib_shared
+    problem = _calib_problem(s['c0'], s['free'], s['data'], s['branch'], s['I_floor'])
+    if not np.all(np.isfinite(problem.fun(x0))):
+        return None     # The random starting point left the valid region of the model
+    sol = least_squares(problem.fun, x0, jac=problem.jac_fun, **s['lsq_kwargs'])
+    sol.c = np.array(s['c0'], dtype=float)
+    sol.c[s['free']] = sol.x
+    return sol
+
+def calib_fit(V_m, Ndisc, I_meas, rvar=45e-9, lvar=0.4, branch='neg', c0=None, free=None,
+              n_starts=1, spread=0.1, seed=None, workers=1, I_floor=1e-12, **lsq_kwargs):
+    # Multi-start least-squares fit of the coefficients of one branch
+    #   free:       names of the fitted coefficients (default: all coefficients of the branch)
+    #   n_starts:   number of starting points; the first one is c0, the rest are c0*(1+spread*N(0,1))
+    #               (starting points where the model is not finite are discarded)
+    #   workers:    number of parallel processes for the multi-start (1 -> serial)
+    #   lsq_kwargs: passed to least_squares (default x_scale='jac')
+    # Returns the best coefficient vector (ordered as calib_names(branch)) and all the least_squares results
+    V_m, Ndisc, rvar, lvar = _calib_inputs(V_m, Ndisc, rvar, lvar)
+    I_meas = np.broadcast_to(np.asarray(I_meas, dtype=float), V_m.shape)
+    
+    names = calib_names(branch)
+    c0 = calib_coefs(branch) if c0 is None else np.asarray(c0, dtype=float)
+    free = np.arange(len(names)) if free is None else np.array([names.index(name) for name in free])
+    lsq_kwargs.setdefault('x_scale', 'jac')
+    
+    # Keep only the samples of the fitted branch
+    sel = (V_m <= 0) if branch == 'neg' else (V_m >= 0)
+    sel &= (Ndisc > 0) & np.isfinite(I_meas)
+    data = (V_m[sel], Ndisc[sel], I_meas[sel], rvar[sel], lvar[sel])
+    
+    rng = np.random.default_rng(seed)
+    starts = [c0[free]] + [c0[free]*(1 + spread*rng.standard_normal(len(free))) for _ in range(n_starts - 1)]
+    setup = (c0, free, data, branch, I_floor, lsq_kwargs)
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_calib_fit_init, initargs=setup) as pool:
+            results = list(pool.map(_calib_fit_start, starts))
+    else:
+        try:
+            _calib_fit_init(*setup)
+            results = [_calib_fit_start(x0) for x0 in starts]
+        finally:
+            _calib_shared.clear()
+    results = [sol for sol in results if sol is not None]
+    if not results:
+        raise ValueError('The model is not finite at any starting point. Please check c0 and spread.')
+    best = min(results, key=lambda sol: sol.cost)
+    return best.c, results
+
+
+#######################################################################
+# 4. Variability sensitivity analysis (forward sensitivities w.r.t. rvar and lvar)
+#######################################################################
+# The state equation (2) is integrated together with its forward sensitivity equations
+#
+#           dS_p/dt = dg/dNd * S_p + p*dg/dp,    S_p = p*dNd/dp,    p in {rd,ld}      (4)
+#
+# for a batch of devices driven by the same pulse. The right-hand side of (4) is the
+# directional derivative of g along (S_p, p), obtained by complex-step differentiation:
+#
+#           dS_p/dt = Im{g(Nd + i*h*S_p, p*(1 + i*h))} / h                           (5)
+#
+# The directions of rd and ld of all devices are stacked and evaluated by ONE complex call
+# of dNdisc_dt_test per solver step. Since h is tiny (1e-30) and only the imaginary part is
+# perturbed, (5) is exact to machine precision for any size of S_p and the real state never
+# leaves [Ndiscmin, Ndiscmax]. The nominal state equation is evaluated by a separate real call.
+# 
+# - The sensitivities are integrated in normalized form (S_p=p*dNd/dp). On the switching
+#   fronts S_p grows 2-3 orders of magnitude above Nd, so their absolute tolerance is set
+#   separately (sens_atol) from the one of Nd (atol)
+
+sens_step = 1e-30   # Complex step h of Eq. (5)
+
+def _sens_stack(Ndisc, S_r, S_l, rvar, lvar):
+    # Complex (Ndisc, rvar, lvar) along the directions of rvar and lvar, stacked along the first axis
+    Ndisc_b = np.concatenate([Ndisc + 1j*sens_step*S_r, Ndisc + 1j*sens_step*S_l])
+    rvar_b = np.concatenate([rvar*(1 + 1j*sens_step), rvar + 0j])
+    lvar_b = np.concatenate([lvar + 0j, lvar*(1 + 1j*sens_step)])
+    return Ndisc_b, rvar_b, lvar_b
+
+def dNdisc_dt_sens(t, y, my_pulse, rvar, lvar, Ndiscmin, Ndiscmax):
+    # Right-hand side of the augmented system y = [Ndisc, rvar*dNdisc/drvar, lvar*dNdisc/dlvar] (one block per device)
+    n = len(rvar)
+    Ndisc, S_r, S_l = y.reshape(3, n)
+    V_m = my_pulse.pulse_gen(np.array([t]))
+    Ndisc_b, rvar_b, lvar_b = _sens_stack(Ndisc, S_r, S_l, rvar, lvar)
+    dS = dNdisc_dt_test(V_m, Ndisc_b, rvar_b, lvar_b, np.tile(Ndiscmin, 2), np.tile(Ndiscmax, 2)).imag / sens_step
+    return np.concatenate([dNdisc_dt_test(V_m, Ndisc, rvar, lvar, Ndiscmin, Ndiscmax), dS])
+
+def simulate_sens(my_pulse, t_span, Ninit=0.010, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20,
+                  atol=1e-6, sens_atol=1e-3, **ivp_kwargs):
+    # Transient simulation of a batch of devices with the sensitivities of Ndisc and I_mem w.r.t. rvar and lvar
+    #   atol:       absolute tolerance of the Ndisc rows
+    #   sens_atol:  absolute tolerance of the normalized sensitivity rows (S_p=p*dNdisc/dp)
+    # Returns the solve_ivp result with the additional fields (rows: devices, columns: sol.t)
+    #   V_m, Ndisc, I_mem, dN_dr, dN_dl, dI_dr, dI_dl
+    from scipy.integrate import solve_ivp
+    Ninit, rvar, lvar, Ndiscmin, Ndiscmax = (np.array(x, dtype=float) for x in
+                                             np.broadcast_arrays(*(np.atleast_1d(x) for x in (Ninit, rvar, lvar, Ndiscmin, Ndiscmax))))
+    n = len(rvar)
+    y0 = np.concatenate([Ninit, np.zeros(2*n)])
+    atol = np.concatenate([np.full(n, atol), np.full(2*n, sens_atol)])
+    sol = solve_ivp(dNdisc_dt_sens, t_span, y0, args=(my_pulse, rvar, lvar, Ndiscmin, Ndiscmax), atol=atol, **ivp_kwargs)
+    
+    Ndisc, S_r, S_l = sol.y.reshape(3, n, -1)
+    sol.V_m = my_pulse.pulse_gen(sol.t)
+    sol.Ndisc = Ndisc
+    sol.dN_dr = S_r / rvar[:, None]
+    sol.dN_dl = S_l / lvar[:, None]
+    
+    # Sensitivities of I_mem along the trajectory (dI/dp = dI/dNd*dNd/dp + dI/dp) in one complex evaluation
+    Ndisc_b, rvar_b, lvar_b = _sens_stack(Ndisc, S_r, S_l, rvar[:, None], lvar[:, None])
+    dI = Imem(sol.V_m, Ndisc_b, rvar_b, lvar_b).imag.reshape(2, n, -1) / sens_step
+    sol.I_mem = Imem(sol.V_m, Ndisc, rvar[:, None], lvar[:, None])
+    sol.dI_dr = dI[0] / rvar[:, None]
+    sol.dI_dl = dI[1] / lvar[:, None]
+    return sol
+
+#######################################################################
+# 5. Reduced-precision (float32) evaluation
+#######################################################################
+# For large arrays of devices the evaluation of Imem and dNdisc/dt is memory-bandwidth bound.
+# Imem_lowp and dNdisc_dt_lowp keep the state, the p_X,Y terms and all temporaries in float32
+# (selectable also with the dtype argument of Imem and dNdisc_dt_test). A plain cast of the
+# float64 formulas is NOT accurate in float32, so the numerically delicate parts are reformulated:
+#   - L=log(Ndisc/Ndmin) is evaluated once and reused by all the terms
+#   - The sigmoids of p9, p10, p11 (V_m<0) are evaluated as weighted sums of their limits
+#   - ExpLin part: p2 is almost -p4, so p2*(exp(x)-1)+(L-p3), with x=(L-p3)/p4, cancels.
+#     It is evaluated as (L-p3)*(p2+p4)/p4 + p2*(expm1(x)-x), with p2_0+p4_0 summed in float64
+#   - Generalized logistic function part: the powers are evaluated in the log domain,
+#     (p8*exp(L-p9))**(-p10) = exp(-p10*(log(p8)+L-p9)) and D**(-1/p11) = exp(-log(D)/p11),
+#     so that D**(1/p11) (up to 1e145 for V_m<0) does not overflow
+#   - Arrhenius terms: the exponents dWamin/(kb*T) and dWamax/(kb*T) use the float64 constant dWa*e/kb,
+#     and their difference is taken as exp(-dWamin/(kb*T))*(-expm1(-(dWamax-dWamin)/(kb*T)))
+#   - The small physical constants (e, A, 1e26) cancel out analytically in E_ion and dNdisc/dt
+#
+# Accuracy against the float64 functions (lowp_accuracy(), 2e5 random samples,
+# Ndisc in [4e-3,22], rvar/lvar in their ranges, |V_m| in [0.05,1.3]):
+#
+#                           V_m<0 (median / max)        V_m>0 (median / max)
+#   plain float32 cast
+#       Imem                2.0e-03 / 4.0e-01           1.4e-06 / 3.5e-05
+#       dNdisc_dt           2.4e-02 / inf               8.6e-04 / 1.3e-02
+#   Imem_lowp               1.4e-07 / 8.5e-06           8.8e-07 / 1.8e-05
+#   dNdisc_dt_lowp          2.2e-06 / 3.7e-04           7.1e-06 / 1.2e-02 (*)
+#
+#   (*) Ndisc within 0.1% of Ndiscmin, where Flim=1-(Ndiscmin/Ndisc)**10 is at the float32
+#       resolution of the state itself. Elsewhere the maximum error is 1.2e-04
+
+def _lowp_pXY(c, d_r, d_l, cmap):
+    # p_X,Y terms of Eq. (3) without forming the basis matrix of the calibration
+    basis = {'1': 1, 'r': d_r, 'l': d_l, 'r2': d_r*d_r, 'rl': d_r*d_l, 'r2l': d_r*d_r*d_l}
+    pXY = {}
+    for c_k, (_, term, b) in zip(c, cmap):
+        pXY[term] = pXY.get(term, 0) + c_k*basis[b]
+    return pXY
+
+def _lowp_glf(L, p5, p6, p7, p8, p9, p10, p11):
+    # Generalized logistic function part evaluated in the log domain
+    D = p6 + p7*np.exp(-p10*(np.log(p8) + L - p9))
+    return p5*np.exp(-np.log(D)/p11)
+
+def _lowp_sigmoid(V_m, y_0, y_1, y_2, y_3):
+    # y_0 + (y_1-y_0)/(1+exp(u)) as a weighted sum, since y_0+(y_1-y_0) cancels when y is close to y_1
+    u = (V_m - y_2)/y_3
+    return y_0/(1 + np.exp(-u)) + y_1/(1 + np.exp(u))
+
+def Imem_lowp(V_m, Ndisc, rvar=45e-9, lvar=0.4, dtype=np.float32):
+    dtype = np.dtype(dtype).type    # Scalar type (np.float32), also for 'float32' and np.dtype('float32')
+    V_m, Ndisc, rvar, lvar = (np.atleast_1d(np.asarray(x, dtype=dtype)) for x in (V_m, Ndisc, rvar, lvar))
+    d_r = (rvar - rdet) / (delta_r * rdet)     #Eq.(16) in [1]
+    d_l = (lvar - ldet) / (delta_l * ldet)     #Eq.(16) in [1]
+    L = np.log(Ndisc/Ndmin)
+    
+    # V_m<0
+    P = _lowp_pXY(calib_coefs('neg').astype(dtype), d_r, d_l, calib_map_neg)
+    p1 = P['p1_0']*(P['p1_1']*V_m + P['p1_2']*(V_m**2))/(1 + P['p1_3']*V_m + P['p1_4']*(V_m**2))
+    E4 = P['p4_1']*np.exp(-P['p4_2']*V_m)
+    p4 = P['p4_0'] - E4
+    p24 = dtype(p2_0_n + p4_0_n) - E4                              # p2+p4 without cancellation (p2=p2_0)
+    A = L - (P['p3_0'] + P['p3_1']*V_m)
+    x = A/p4
+    expm1_x = np.where(np.abs(x) < 1e-1, (x*x/2)*(1 + x/3 + x*x/12 + x*x*x/60), np.expm1(x) - x)
+    I_neg = p1*(A*p24/p4 + P['p2_0']*expm1_x)                     #ExpLin part
+    p5 = P['p5_1']*V_m + P['p5_2']*(V_m**2)
+    p9 = _lowp_sigmoid(V_m, P['p9_0'], P['p9_1'], P['p9_2'], P['p9_3'])
+    p10 = _lowp_sigmoid(V_m, P['p10_0'], P['p10_1'], P['p10_2'], P['p10_3'])
+    p11 = 1/_lowp_sigmoid(V_m, P['p11_0'], P['p11_1'], P['p11_2'], P['p11_3'])
+    I_neg = I_neg + _lowp_glf(L, p5, 1, P['p7_0'], 1, p9, p10, p11)     #Generalized logistic function part
+    
+    # V_m>0
+    P = _lowp_pXY(calib_coefs('pos').astype(dtype), d_r, d_l, calib_map_pos)
+    p5 = -P['p5_1']*np.expm1(-P['p5_2']*V_m)                          #Eq.(12) in [1] with p5_0=p5_1
+    p6 = P['p6_0'] + P['p6_1']*V_m
+    p7 = P['p7_0'] + P['p7_1']*V_m + P['p7_2']*np.exp(-P['p7_3']*V_m)   #Eq.(7) in [1]
+    p8 = P['p8_0'] + P['p8_1']*V_m
+    p10 = P['p10_0'] + P['p10_1']*V_m + P['p10_2']*(V_m**2)
+    p11 = P['p11_0'] + P['p11_1']*V_m + P['p11_2']*(V_m**2)
+    I_pos = _lowp_glf(L, p5, p6, p7, p8, 0, p10, p11)
+    
+    I_mem = np.where(V_m < 0, I_neg, I_pos)
+    return np.where(Ndisc <= 0, np.nan, I_mem).astype(dtype, copy=False)
+
+def dNdisc_dt_lowp(V_m, Ndisc, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20, dtype=np.float32, coupling=None):
+    dtype = np.dtype(dtype).type
+    V_m, Ndisc, rvar, lvar, Ndiscmin, Ndiscmax = (np.atleast_1d(np.asarray(x, dtype=dtype))
+                                                  for x in (V_m, Ndisc, rvar, lvar, Ndiscmin, Ndiscmax))
+    cond_nan = (Ndisc < Ndiscmin * (1 - 1e-8)) | (Ndisc > Ndiscmax * (1 + 1e-8))
+    I_mem = Imem_lowp(V_m, Ndisc, rvar, lvar, dtype)
+    Rseries = RseriesTiOx + R0 * (1 + R0 * alphaline * (I_mem ** 2) * Rthline)
+    Vseries = I_mem * Rseries
+    
+    cond_update = ((Ndisc < Ndiscmin) & (V_m > 0)) | ((Ndisc > Ndiscmax) & (V_m < 0))
+    
+    # E_ion*zvo*a/(pi*dWa) with Vdisc/(lvar*1e-9) = I_mem/(Ndisc*1e26*zvo*e*un*pi*rvar^2)
+    gamma = np.where(V_m < 0,
+                     I_mem / (Ndisc * (rvar*1e9)**2) * dtype(a / (math.pi * dWa * 1e26 * e * un * math.pi * 1e-18)),
+                     (V_m - Vseries) * dtype(zvo * a / (lcell * 1e-9 * math.pi * dWa)))
+    Rtheff = np.where(V_m < 0, Rth0 * (rdet/rvar)**2, Rth0 * Rtheff_scaling * (rdet/rvar)**2)
+    Flim = np.where(V_m < 0, 1 - (Ndisc / Ndiscmax) ** 10, 1 - (Ndiscmin / Ndisc) ** 10)
+    T = I_mem * (V_m - Vseries) * Rtheff + T0
+    if coupling is not None:    # Thermal crosstalk in device arrays, Eq. (6)
+        dT = T - T0
+        T = T + (coupling @ np.where(np.isfinite(dT), dT, 0)).astype(dtype, copy=False)
+    
+    dWa_kb = dtype(dWa * e / kb)
+    Wamin = dWa_kb * (np.sqrt(1 - gamma ** 2) - gamma * dtype(math.pi / 2) + gamma * np.arcsin(gamma)) / T   # dWamin/(kb*T)
+    Wadiff = dWa_kb * dtype(math.pi) * gamma / T                                                              # (dWamax-dWamin)/(kb*T)
+    # -I_ion/(A*lvar*1e-9*e*zvo)/1e26 with cvo = (Nplug+Ndisc)/2*1e26
+    Ndisc_update = (Nplug + Ndisc) * (dtype(a * ny0 / 2e-9) / lvar) * np.exp(-Wamin) * np.expm1(-Wadiff) * Flim
+    
+    return np.where(cond_nan, np.nan, np.where(cond_update, 0, Ndisc_update)).astype(dtype, copy=False)
+
+def lowp_accuracy(n=200000, seed=0, dtype=np.float32):
+    # Relative errors (median, max) of Imem_lowp and dNdisc_dt_lowp against the float64 functions for both polarities
+    rng = np.random.default_rng(seed)
+    Ndisc = np.exp(rng.uniform(np.log(4e-3), np.log(22), n))
+    rvar = rng.uniform(40.5e-9, 49.5e-9, n)
+    lvar = rng.uniform(0.36, 0.44, n)
+    acc = {}
+    for polarity, V_m in (('neg', -rng.uniform(0.05, 1.3, n)), ('pos', rng.uniform(0.05, 1.3, n))):
+        for name, f_64, f_lowp in (('Imem', Imem(V_m, Ndisc, rvar, lvar), Imem_lowp(V_m, Ndisc, rvar, lvar, dtype)),
+                                   ('dNdisc_dt', dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22),
+                                    dNdisc_dt_lowp(V_m, Ndisc, rvar, lvar, 4e-3, 22, dtype))):
+            sel = np.isfinite(f_64) & (f_64 != 0)
+            err = np.abs(f_lowp[sel] - f_64[sel]) / np.abs(f_64[sel])
+            acc[(name, polarity)] = (np.median(err), np.max(err))
+    return acc
+
+#######################################################################
+# 6. Batch transient simulation
+#######################################################################
+# Transient simulation of an array of independent devices driven by the same pulse.
+# The state vector holds one Ndisc per device and the state equation is evaluated by
+# ONE vectorized call of dNdisc_dt_test per solver step (the solver step is shared).
+
+def dNdisc_dt_batch(t, y, my_pulse, rvar, lvar, Ndiscmin, Ndiscmax, dtype=None, coupling=None):
+    V_m = my_pulse.pulse_gen(np.array([t]))
+    return dNdisc_dt_test(V_m, y, rvar, lvar, Ndiscmin, Ndiscmax, dtype, coupling)
+
+def simulate(my_pulse, t_span, Ninit=0.010, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20, dtype=None, coupling=None, **ivp_kwargs):
+    #   coupling:   sparse thermal coupling matrix of the devices (see section 7), None for isolated devices
+    # Returns the solve_ivp result with the additional fields (rows: devices, columns: sol.t)
+    #   V_m, Ndisc, I_mem
+    from scipy.integrate import solve_ivp
+    Ninit, rvar, lvar, Ndiscmin, Ndiscmax = (np.array(x, dtype=float) for x in
+                                             np.broadcast_arrays(*(np.atleast_1d(x) for x in (Ninit, rvar, lvar, Ndiscmin, Ndiscmax))))
+    sol = solve_ivp(dNdisc_dt_batch, t_span, Ninit, args=(my_pulse, rvar, lvar, Ndiscmin, Ndiscmax, dtype, coupling), **ivp_kwargs)
+    sol.V_m = my_pulse.pulse_gen(sol.t)
+    sol.Ndisc = sol.y
+    sol.I_mem = Imem(sol.V_m, sol.y, rvar[:, None], lvar[:, None], dtype)
+    return sol
+
+#######################################################################
+# 7. Thermal crosstalk in device arrays
+#######################################################################
+# dNdisc_dt_test computes the filament temperature of every device from its own Joule heating,
+#
+#           T_i = T0 + dT_i,    dT_i = I_mem,i*(V_m - Vseries,i)*Rtheff,i
+#
+# ie. every device is isolated at the ambient temperature T0. In dense arrays the neighbouring
+# devices heat each other. With the coupling argument of dNdisc_dt_test (and simulate) the
+# effective ambient temperature of each device includes the temperature rise of its neighbours:
+#
+#           T_i = T0 + dT_i + sum_j K_ij*dT_j                   (6)
+#
+# where K is a sparse (scipy.sparse) n x n coupling matrix with dimensionless coefficients and
+# zero diagonal, in the order of the device arrays. Eq. (6) is one sparse matrix-vector product
+# per evaluation, so the cost stays linear in the number of devices (first-order coupling: the
+# neighbours contribute their self-heating dT_j, not their own coupled temperature).
+#
+# - thermal_coupling_grid builds K for a rows x cols crossbar (devices in row-major order)
+# - A device without a valid dT_j (NaN, eg. Ndisc<=0) contributes dT_j=0, so it does not spread NaN to its neighbours
+
+def thermal_coupling_grid(rows, cols, k_side, k_diag=0.0):
+    # k_side: coupling to the 4 side neighbours, k_diag: coupling to the 4 diagonal neighbours
+    import scipy.sparse as sp
+    r, c = np.divmod(np.arange(rows*cols), cols)
+    K_rows, K_cols, K_data = [], [], []
+    for dr, dc, k in ((0, 1, k_side), (0, -1, k_side), (1, 0, k_side), (-1, 0, k_side),
+                      (1, 1, k_diag), (1, -1, k_diag), (-1, 1, k_diag), (-1, -1, k_diag)):
+        if k == 0:
+            continue
+        valid = (r + dr >= 0) & (r + dr < rows) & (c + dc >= 0) & (c + dc < cols)
+        K_rows.append((r*cols + c)[valid])
+        K_cols.append(((r + dr)*cols + c + dc)[valid])
+        K_data.append(np.full(np.count_nonzero(valid), k, dtype=float))
+    if not K_data:
+        return sp.csr_matrix((rows*cols, rows*cols))
+    return sp.csr_matrix((np.concatenate(K_data), (np.concatenate(K_rows), np.concatenate(K_cols))), shape=(rows*cols, rows*cols))
+
+
 ##########################
 # PULSE GENERATION CLASS #
 ##########################
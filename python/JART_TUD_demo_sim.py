@@ -2,7 +2,7 @@ import JART_TUD_VCM_lib as vns
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
-from scipy.integrate import solve_ivp
+from JART_TUD_sim_cache import JART_TUD_sim_cache
 import pandas as pd
 from matplotlib_inline.backend_inline import set_matplotlib_formats
 set_matplotlib_formats('svg')
@@ -18,6 +18,7 @@ if __name__ == "__main__":
     t_max = 2*t_neg + 2*t_pos
     
     rel_tol = 1e-12
+    cache = JART_TUD_sim_cache()    # Transients already solved in a previous run are loaded from the cache
     
     ld_set = np.array([.36, .4, .44])
     # ld_set = np.array([.4,])
@@ -62,12 +63,12 @@ if __name__ == "__main__":
             mem1 = vns.JART_TUD_memristor(Ninit = 0.010, lvar = ld, rvar = rd, Ndiscmin = 4e-3, Ndiscmax = 22)
             pul = vns.pulse(p_form='trig',V_tr_p=V_neg_peak,t_tr_p=t_pos,V_tr_n=V_pos_peak,t_tr_n=t_neg)
             
-            sol = solve_ivp(mem1.dNdisc_dt, [0, t_max], [mem1.Ndisc], method='DOP853', args=(pul, ), rtol=rel_tol, max_step=t_max/1000)
+            sol = cache.simulate(pul, [0, t_max], mem1.Ndisc, mem1.rvar, mem1.lvar, mem1.Ndiscmin, mem1.Ndiscmax,
+                                 method='DOP853', rtol=rel_tol, max_step=t_max/1000)
             
-            V_applied = pul.pulse_gen(sol.t)
-            V_m = np.array(V_applied)
-            Ndisc = np.array(sol.y[0])
-            I_calc = vns.Imem(V_m, Ndisc, lvar = ld, rvar = rd)
+            V_applied = np.array(sol.V_m)
+            Ndisc = np.array(sol.Ndisc[0])
+            I_calc = np.array(sol.I_mem[0])
             
             ######################################################################################################
             # Plots
@@ -79,7 +80,7 @@ if __name__ == "__main__":
             ax2_1.set_yscale('log', base=10)
             ax2_1.set_ylim(1e-9)
             
-            ax3_1.plot(sol.t,sol.y[0] ,'.-')
+            ax3_1.plot(sol.t,Ndisc ,'.-')
             ax3_1.plot(selected_rows['time'],selected_rows['Nd'])
             ax3_1.set_yscale('log', base=10)
             
@@ -0,0 +1,150 @@
+############################ JART-TUD VCM device model ############################
+# JART-TUD VCM Simulation Cache
+#
+# Content-addressed on-disk cache of transient simulations (see simulate() in JART_TUD_VCM_lib).
+# A simulation is identified by the SHA-256 hash of
+#   - the pulse configuration (p_form and its amplitudes/durations)
+#   - the time span and the device parameters (Ninit, rvar, lvar, Ndiscmin, Ndiscmax) of all the devices
+#   - the current values of all the JART_TUD_params parameters (including coefficients loaded with calib_load())
+#   - the solver settings (solve_ivp keyword arguments), the evaluation dtype and the thermal coupling matrix
+#
+# Each entry is ONE .npy file holding the rows [t, V_m, Ndisc (one row per device), I_mem (one row per device)].
+# A cache hit is served by memory mapping this file (np.load with mmap_mode='r'), no re-integration.
+# The total size of the cache is bounded (max_bytes); the least recently used entries are evicted first
+# (the modification time of an entry is refreshed on every hit).
+#
+# - Only successful simulations (status 0) are cached
+# - Non-serializable solver settings (e.g. events, callables) cannot be cached and raise TypeError
+# - Only t, V_m, Ndisc and I_mem are stored: solver settings whose output is not part of them
+#   (dense_output, events) raise TypeError
+###################################################################################
+import hashlib
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+import numpy as np
+import JART_TUD_VCM_lib as vns
+import JART_TUD_params
+
+cache_version = 1   # Part of the hash; increase it when the model equations change
+
+
+def _json_default(x):
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    elif isinstance(x, np.generic):
+        return x.item()
+    elif hasattr(x, 'tocsr'):     # Sparse thermal coupling matrix, in canonical CSR form
+        x = x.tocsr(copy=True)
+        x.sum_duplicates()
+        x.sort_indices()
+        return {'shape': x.shape, 'indptr': x.indptr, 'indices': x.indices, 'data': x.data}
+    raise TypeError(f'Solver setting of type {type(x).__name__} cannot be cached.')
+
+def pulse_config(my_pulse):
+    # Constructor arguments of a pulse object (e.g. {'p_form': 'DC', 'V_dc': -0.6})
+    return {name.split('__')[-1]: value for name, value in vars(my_pulse).items()}
+
+def model_params():
+    # Current values of the JART_TUD_params parameters, as used by JART_TUD_VCM_lib
+    return {name: getattr(vns, name) for name, value in sorted(vars(JART_TUD_params).items())
+            if not name.startswith('_') and isinstance(value, (int, float))}
+
+
+class JART_TUD_sim_cache:
+    def __init__(self,
+                 root='JART_TUD_cache',     #Cache directory
+                 max_bytes=2**30            #Size bound of the cache [bytes]
+                 ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.n_hits = 0
+        self.n_misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, my_pulse, t_span, Ninit=0.010, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20, dtype=None, **ivp_kwargs):
+        devices = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float)) for x in (Ninit, rvar, lvar, Ndiscmin, Ndiscmax)))
+        content = {'version': cache_version,
+                   'pulse': pulse_config(my_pulse),
+                   't_span': [float(t) for t in t_span],
+                   'devices': devices,
+                   'params': model_params(),
+                   'solver': ivp_kwargs,
+                   'dtype': None if dtype is None else np.dtype(dtype).name}
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=_json_default).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key + '.npy')
+
+    def simulate(self, my_pulse, t_span, Ninit=0.010, rvar=45e-9, lvar=0.4, Ndiscmin=8e-3, Ndiscmax=20, dtype=None, **ivp_kwargs):
+        # Same arguments as simulate() in JART_TUD_VCM_lib
+        # Returns the fields t, V_m, Ndisc, I_mem (rows: devices, columns: t), status and cache_hit
+        for name in ('dense_output', 'events'):
+            if ivp_kwargs.get(name):
+                raise TypeError(f'The output of the solver setting {name} cannot be cached.')
+        key = self.key(my_pulse, t_span, Ninit, rvar, lvar, Ndiscmin, Ndiscmax, dtype, **ivp_kwargs)
+        result = self.load(key)
+        if result is not None:
+            self.n_hits += 1
+            return result
+        self.n_misses += 1
+        sol = vns.simulate(my_pulse, t_span, Ninit, rvar, lvar, Ndiscmin, Ndiscmax, dtype, **ivp_kwargs)
+        if sol.status == 0:
+            self.store(key, np.vstack([sol.t, sol.V_m, sol.Ndisc, sol.I_mem]))
+        return SimpleNamespace(t=sol.t, V_m=sol.V_m, Ndisc=sol.Ndisc, I_mem=sol.I_mem, status=sol.status, cache_hit=False)
+
+    def load(self, key):
+        try:
+            data = np.load(self.path(key), mmap_mode='r')
+            os.utime(self.path(key))    # LRU: mark as recently used
+        except FileNotFoundError:
+            return None
+        n = (data.shape[0] - 2) // 2
+        return SimpleNamespace(t=data[0], V_m=data[1], Ndisc=data[2:2+n], I_mem=data[2+n:], status=0, cache_hit=True)
+
+    def store(self, key, data):
+        # Atomic write (temporary file + rename), so that concurrent readers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(data, dtype=float))
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            try:
+                os.remove(tmp)      # Temporary files are not entries, so evict() would never remove them
+            except FileNotFoundError:
+                pass
+            raise
+        self.evict()
+
+    def entries(self):
+        # (modification time, size, path) of all the entries, least recently used first
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,254 @@
+############################ JART-TUD VCM device model ############################
+# JART-TUD VCM Simulation Server
+#
+# A local (localhost) simulation service for tools that would otherwise start their own
+# Python process, import the library and warm up for every call. The server is started once:
+#
+#           python JART_TUD_sim_server.py --port 8765
+#
+# and accepts newline-delimited JSON requests over TCP. Concurrent requests are collected for
+# a short batching window (batch_window) and the compatible ones are coalesced into ONE
+# vectorized call of the library, whose results are split back to the clients.
+#
+# Requests (all the arrays are broadcast to 1D arrays, "id" is echoed in the response)
+#   {"id": 1, "op": "Imem", "V_m": [...], "Ndisc": [...], "rvar": 45e-9, "lvar": 0.4}
+#   {"id": 2, "op": "dNdisc_dt", "V_m": [...], "Ndisc": [...], "rvar": ..., "lvar": ..., "Ndiscmin": 8e-3, "Ndiscmax": 20}
+#   {"id": 3, "op": "simulate", "pulse": {"p_form": "DC", "V_dc": -0.6}, "t_span": [0, 1e-2],
+#    "Ninit": 0.010, "rvar": ..., "lvar": ..., "Ndiscmin": ..., "Ndiscmax": ..., "solver": {"method": "RK45", "rtol": 1e-9},
+#    "batch": false}
+#   Optional for all the operations: "dtype": "float32" (reduced-precision evaluation)
+#
+# Responses
+#   {"id": 1, "result": {"I_mem": [...]}}
+#   {"id": 2, "result": {"dNdisc_dt": [...]}}
+#   {"id": 3, "result": {"status": 0, "t": [...], "V_m": [...], "Ndisc": [[...]], "I_mem": [[...]]}}  (one row per device)
+#   {"id": ..., "error": "..."}
+#
+# - Imem/dNdisc_dt requests with the same dtype are concatenated into one array evaluation
+# - simulate requests are solved one by one by default, so that their results do not depend on other clients.
+#   Requests with "batch": true and the same pulse, t_span, solver settings and dtype are solved as one
+#   device array (see simulate() in JART_TUD_VCM_lib). They share the adaptive solver steps and the error
+#   control of the stacked state: the t grid and the trajectory of a request then depend on the requests
+#   it was batched with, and a stiff device slows down the whole batch
+# - Request lines may be up to max_line bytes long (longer ones are answered with an error and the connection
+#   is closed); async_request reads response lines up to its own max_line
+###################################################################################
+import asyncio
+import json
+import socket
+import numpy as np
+import JART_TUD_VCM_lib as vns
+
+
+def _device_arrays(req, names, defaults):
+    return np.broadcast_arrays(*(np.atleast_1d(np.asarray(req.get(name, default), dtype=float))
+                                 for name, default in zip(names, defaults)))
+
+def _run_arrays(op, reqs):
+    # Imem / dNdisc_dt: concatenate all the requests, evaluate once, split the result
+    if op == 'Imem':
+        names, defaults = ('V_m', 'Ndisc', 'rvar', 'lvar'), (np.nan, np.nan, 45e-9, 0.4)
+    else:
+        names, defaults = ('V_m', 'Ndisc', 'rvar', 'lvar', 'Ndiscmin', 'Ndiscmax'), (np.nan, np.nan, 45e-9, 0.4, 8e-3, 20)
+    arrays = [_device_arrays(req, names, defaults) for req in reqs]
+    args = [np.concatenate(x) for x in zip(*arrays)]
+    if op == 'Imem':
+        out = vns.Imem(*args, dtype=reqs[0].get('dtype'))
+    else:
+        out = vns.dNdisc_dt_test(*args, dtype=reqs[0].get('dtype'))
+    splits = np.cumsum([len(x[0]) for x in arrays])[:-1]
+    name = 'I_mem' if op == 'Imem' else op
+    return [{name: part.tolist()} for part in np.split(out, splits)]
+
+def _run_simulate(reqs):
+    # simulate: stack the devices of all the requests into one device array
+    names, defaults = ('Ninit', 'rvar', 'lvar', 'Ndiscmin', 'Ndiscmax'), (0.010, 45e-9, 0.4, 8e-3, 20)
+    arrays = [_device_arrays(req, names, defaults) for req in reqs]
+    args = [np.concatenate(x) for x in zip(*arrays)]
+    pul = vns.pulse(**reqs[0]['pulse'])
+    sol = vns.simulate(pul, reqs[0]['t_span'], *args, dtype=reqs[0].get('dtype'), **reqs[0].get('solver', {}))
+    if sol.status < 0:
+        raise ValueError(sol.message)
+    bounds = np.cumsum([0] + [len(x[0]) for x in arrays])
+    return [{'status': sol.status, 't': sol.t.tolist(), 'V_m': sol.V_m.tolist(),
+             'Ndisc': sol.Ndisc[i:j].tolist(), 'I_mem': sol.I_mem[i:j].tolist()}
+            for i, j in zip(bounds[:-1], bounds[1:])]
+
+def _batch_key(req):
+    # Requests with the same key are coalesced into one batch
+    op = req.get('op')
+    if op in ('Imem', 'dNdisc_dt'):
+        return (op, req.get('dtype'))
+    elif op == 'simulate':
+        if not req.get('batch', False):
+            return (op, id(req))    # A batch of its own
+        return (op, req.get('dtype'), json.dumps([req['pulse'], req['t_span'], req.get('solver', {})], sort_keys=True))
+    raise NameError("Invalid op. Please insert a valid op (Imem / dNdisc_dt / simulate)!")
+
+
+class JART_TUD_sim_server:
+    def __init__(self,
+                 host='127.0.0.1',      #Localhost only
+                 port=8765,             #0 selects a free port
+                 batch_window=2e-3,     #Time to collect concurrent requests [s]
+                 max_batch=1024,        #Maximum number of requests in a batch
+                 max_line=2**28         #Maximum length of a request line [bytes]
+                 ):
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_line = max_line
+        self.n_requests = 0
+        self.n_batches = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        self._clients = {}      #Connection handler tasks and their writers
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=self.max_line)
+        self.port = self._server.sockets[0].getsockname()[1]
+        vns.Imem(np.array([-1.0, 1.0]), np.array([1.0, 1.0]))     #Warm-up
+
+    async def stop(self):
+        # Close the connections first, so that their handlers end normally, then stop the batching loop
+        self._server.close()
+        for writer in self._clients.values():
+            writer.close()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+
+    async def serve_forever(self):
+        await self.start()
+        print(f'JART-TUD simulation server listening on {self.host}:{self.port}')
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        # One connection may pipeline several requests; each one is answered when its batch is done
+        self._clients[asyncio.current_task()] = writer
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError) as err:
+                    # The rest of the connection cannot be framed any more: answer and close it
+                    error = f'{type(err).__name__}: request longer than max_line ({self.max_line} bytes)'
+                    await self._write(writer, lock, {'id': None, 'error': error})
+                    break
+                if not line:
+                    break
+                task = asyncio.create_task(self._answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            del self._clients[asyncio.current_task()]
+            writer.close()
+
+    async def _answer(self, line, writer, lock):
+        req = {}
+        try:
+            req = json.loads(line)
+            key = _batch_key(req)
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((key, req, future))
+            resp = {'id': req.get('id'), 'result': await future}
+        except Exception as err:
+            resp = {'id': req.get('id') if isinstance(req, dict) else None, 'error': f'{type(err).__name__}: {err}'}
+        await self._write(writer, lock, resp)
+
+    async def _write(self, writer, lock, resp):
+        async with lock:
+            if writer.is_closing():
+                return      # Connection closed by the client or by stop()
+            writer.write(json.dumps(resp).encode() + b'\n')
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for key, req, future in batch:
+                groups.setdefault(key, []).append((req, future))
+            for key, items in groups.items():
+                self.n_requests += len(items)
+                self.n_batches += 1
+                try:
+                    await self._run_batch(key[0], items)
+                except Exception as err:
+                    if len(items) == 1:
+                        items[0][1].set_exception(err)
+                        continue
+                    # A faulty request must not fail the others: run them one by one
+                    for item in items:
+                        try:
+                            await self._run_batch(key[0], [item])
+                        except Exception as err:
+                            item[1].set_exception(err)
+
+    async def _run_batch(self, op, items):
+        # The numerical work runs in a worker thread, so that new requests are received meanwhile
+        reqs = [req for req, _ in items]
+        loop = asyncio.get_running_loop()
+        if op == 'simulate':
+            results = await loop.run_in_executor(None, _run_simulate, reqs)
+        else:
+            results = await loop.run_in_executor(None, _run_arrays, op, reqs)
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+
+###########
+# CLIENTS #
+###########
+def request(req, host='127.0.0.1', port=8765):
+    # Blocking client: sends one request and returns its result
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall(json.dumps(req).encode() + b'\n')
+        resp = json.loads(sock.makefile('rb').readline())
+    if 'error' in resp:
+        raise RuntimeError(resp['error'])
+    return resp['result']
+
+async def async_request(req, host='127.0.0.1', port=8765, max_line=2**28):
+    # asyncio client: concurrent calls are batched by the server
+    #   max_line:   maximum length of the response line [bytes]
+    reader, writer = await asyncio.open_connection(host, port, limit=max_line)
+    writer.write(json.dumps(req).encode() + b'\n')
+    await writer.drain()
+    resp = json.loads(await reader.readline())
+    writer.close()
+    if 'error' in resp:
+        raise RuntimeError(resp['error'])
+    return resp['result']
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='JART-TUD VCM simulation server (localhost)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--batch-window', type=float, default=2e-3, help='time to collect concurrent requests [s]')
+    parser.add_argument('--max-batch', type=int, default=1024)
+    parser.add_argument('--max-line', type=int, default=2**28, help='maximum length of a request line [bytes]')
+    args = parser.parse_args()
+    asyncio.run(JART_TUD_sim_server(port=args.port, batch_window=args.batch_window, max_batch=args.max_batch,
+                                    max_line=args.max_line).serve_forever())
@@ -0,0 +1,181 @@
+############################ JART-TUD VCM device model ############################
+# Tests of the JART-TUD VCM Library
+# Run from this folder with: python -m pytest -q
+###################################################################################
+import numpy as np
+import pytest
+import JART_TUD_VCM_lib as vns
+
+
+def calib_samples(branch, n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    V_m = rng.uniform(-1.3, -0.01, n) if branch == 'neg' else rng.uniform(0.01, 1.3, n)
+    Ndisc = np.exp(rng.uniform(np.log(4e-3), np.log(20), n))
+    rvar = rng.uniform(40.5e-9, 49.5e-9, n)
+    lvar = rng.uniform(0.36, 0.44, n)
+    return V_m, Ndisc, rvar, lvar
+
+
+#################################
+# 3. Model calibration          #
+#################################
+@pytest.mark.parametrize('branch', ['neg', 'pos'])
+def test_calib_Imem_grad_value(branch):
+    # The calibration kernels must reproduce Imem_neg / Imem_pos for the current coefficients
+    V_m, Ndisc, rvar, lvar = calib_samples(branch)
+    Imem_grad, Imem_ref = (vns.Imem_neg_grad, vns.Imem_neg) if branch == 'neg' else (vns.Imem_pos_grad, vns.Imem_pos)
+    I_mem, _ = Imem_grad(V_m, Ndisc, rvar, lvar)
+    np.testing.assert_allclose(I_mem, Imem_ref(V_m, Ndisc, rvar, lvar), rtol=1e-10)
+
+
+@pytest.mark.parametrize('branch', ['neg', 'pos'])
+def test_calib_Imem_grad_jacobian(branch):
+    # Every column of the analytic Jacobian against a central finite difference of the coefficient
+    V_m, Ndisc, rvar, lvar = calib_samples(branch)
+    Imem_grad = vns.Imem_neg_grad if branch == 'neg' else vns.Imem_pos_grad
+    c = vns.calib_coefs(branch)
+    _, J = Imem_grad(V_m, Ndisc, rvar, lvar, c)
+    for k, name in enumerate(vns.calib_names(branch)):
+        h = 1e-4*abs(c[k])
+        c_p, c_m = c.copy(), c.copy()
+        c_p[k] += h
+        c_m[k] -= h
+        fd = (Imem_grad(V_m, Ndisc, rvar, lvar, c_p)[0] - Imem_grad(V_m, Ndisc, rvar, lvar, c_m)[0]) / (2*h)
+        err = np.max(np.abs(fd - J[:, k])) / np.max(np.abs(J[:, k]))
+        assert err < 1e-3, name
+
+
+def test_calib_invalid_branch():
+    V_m, Ndisc, rvar, lvar = calib_samples('neg', n=5)
+    with pytest.raises(NameError):
+        vns.calib_residuals(vns.calib_coefs('neg'), V_m, Ndisc, np.ones(5), rvar, lvar, branch='negative')
+
+
+def test_calib_fit_recovery():
+    # Refit synthetic Imem_neg data from perturbed coefficients (multi-start over worker processes)
+    V_m, Ndisc, rvar, lvar = calib_samples('neg', n=400, seed=1)
+    I_meas = vns.Imem_neg(V_m, Ndisc, rvar, lvar)
+    c = vns.calib_coefs('neg')
+    names = vns.calib_names('neg')
+    free = ['p1_0_n', 'Dp1_0_r_n', 'p3_0_n', 'p5_1_n', 'Dp5_1_l_n', 'p7_0_n', 'p9_0_n', 'p10_0_n']
+    idx = [names.index(name) for name in free]
+    c_p = c.copy()
+    c_p[idx] *= 1 + 0.05*np.random.default_rng(2).standard_normal(len(idx))
+    c_fit, results = vns.calib_fit(V_m, Ndisc, I_meas, rvar, lvar, 'neg', c0=c_p, free=free,
+                                   n_starts=3, seed=0, workers=2, x_scale='jac')
+    assert len(results) == 3
+    np.testing.assert_allclose(c_fit, c, rtol=1e-6)
+    try:
+        vns.calib_load(c_p, 'neg')
+        assert np.max(np.abs(vns.Imem_neg(V_m, Ndisc, rvar, lvar)/I_meas - 1)) > 1e-2
+        vns.calib_load(c_fit, 'neg')
+        np.testing.assert_allclose(vns.Imem_neg(V_m, Ndisc, rvar, lvar), I_meas, rtol=1e-6)
+    finally:
+        vns.calib_load(c, 'neg')
+
+
+#################################
+# 4. Sensitivity analysis       #
+#################################
+def test_simulate_sens_set_transition():
+    # Sensitivities after a SET transition against central differences of perturbed solve_ivp runs
+    from scipy.integrate import solve_ivp
+    pul = vns.pulse(p_form='DC', V_dc=-0.6)
+    t_max = 1e-2
+    rvar = np.array([42e-9, 45e-9, 48e-9])
+    lvar = np.array([0.38, 0.40, 0.42])
+    sol = vns.simulate_sens(pul, [0, t_max], 0.010, rvar, lvar, 4e-3, 22, method='RK45', rtol=1e-9)
+    assert sol.status == 0
+    assert sol.Ndisc[2, -1] > 10     # The slowest device has also crossed the SET front
+    
+    def run(rvar, lvar):
+        f = lambda t, y: vns.dNdisc_dt_test(pul.pulse_gen(np.array([t])), y, rvar, lvar, 4e-3, 22)
+        return solve_ivp(f, [0, t_max], np.full(3, 0.010), t_eval=[t_max], method='RK45', rtol=1e-9, atol=1e-9).y[:, -1]
+    
+    h = 1e-4
+    for dN_dp, dI_dp, dp in ((sol.dN_dr, sol.dI_dr, (h*rvar, 0)), (sol.dN_dl, sol.dI_dl, (0, h*lvar))):
+        r_p, l_p, r_m, l_m = rvar + dp[0], lvar + dp[1], rvar - dp[0], lvar - dp[1]
+        N_p, N_m = run(r_p, l_p), run(r_m, l_m)
+        step = 2*(dp[0] + dp[1])
+        fd_N = (N_p - N_m) / step
+        fd_I = (vns.Imem(sol.V_m[-1:], N_p, r_p, l_p) - vns.Imem(sol.V_m[-1:], N_m, r_m, l_m)) / step
+        np.testing.assert_allclose(dN_dp[:, -1], fd_N, rtol=1e-3, atol=1e-6*np.max(np.abs(fd_N)))
+        np.testing.assert_allclose(dI_dp[:, -1], fd_I, rtol=2e-3, atol=1e-6*np.max(np.abs(fd_I)))
+
+
+#################################
+# 5. Reduced precision          #
+#################################
+def test_lowp_dtype():
+    V_m, Ndisc, rvar, lvar = calib_samples('neg', n=10)
+    for dtype in (np.float32, 'float32', np.dtype('float32')):
+        assert vns.Imem(V_m, Ndisc, rvar, lvar, dtype=dtype).dtype == np.float32
+        assert vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22, dtype=dtype).dtype == np.float32
+
+
+def test_lowp_float64_reformulation():
+    # In float64 the reformulated kernels must reproduce the original functions
+    for branch in ('neg', 'pos'):
+        V_m, Ndisc, rvar, lvar = calib_samples(branch, n=1000)
+        np.testing.assert_allclose(vns.Imem_lowp(V_m, Ndisc, rvar, lvar, np.float64), vns.Imem(V_m, Ndisc, rvar, lvar), rtol=1e-9)
+        np.testing.assert_allclose(vns.dNdisc_dt_lowp(V_m, Ndisc, rvar, lvar, 4e-3, 22, np.float64),
+                                   vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22), rtol=1e-7)
+
+
+def test_lowp_accuracy():
+    acc = vns.lowp_accuracy(n=20000)
+    for polarity in ('neg', 'pos'):
+        assert acc[('Imem', polarity)][1] < 1e-4
+        assert acc[('dNdisc_dt', polarity)][0] < 1e-5
+    assert acc[('dNdisc_dt', 'neg')][1] < 1e-3
+
+
+#################################
+# 7. Thermal crosstalk          #
+#################################
+def test_thermal_coupling_grid():
+    K = vns.thermal_coupling_grid(3, 4, 0.1, 0.02).toarray()
+    assert K.shape == (12, 12)
+    np.testing.assert_array_equal(np.diag(K), 0)
+    np.testing.assert_array_equal(K, K.T)
+    assert np.count_nonzero(K[5] == 0.1) == 4 and np.count_nonzero(K[5] == 0.02) == 4     # Inner device
+    assert np.count_nonzero(K[0] == 0.1) == 2 and np.count_nonzero(K[0] == 0.02) == 1     # Corner device
+
+
+def test_thermal_coupling_dNdisc_dt():
+    n = 9
+    Ndisc = np.linspace(0.5, 5, n)
+    rvar = np.full(n, 45e-9)
+    lvar = np.full(n, 0.4)
+    V_m = np.array([-0.8])
+    K = vns.thermal_coupling_grid(3, 3, 0.1, 0.02)
+    g_iso = vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22)
+    np.testing.assert_array_equal(vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22, coupling=0*K), g_iso)
+    g = vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22, coupling=K)
+    assert np.all(np.abs(g) > np.abs(g_iso))      # The neighbours heat the devices, so they switch faster
+    np.testing.assert_allclose(vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22, coupling=K.toarray()), g, rtol=1e-12)
+    np.testing.assert_allclose(vns.dNdisc_dt_test(V_m, Ndisc, rvar, lvar, 4e-3, 22, dtype=np.float32, coupling=K), g, rtol=1e-4)
+
+
+def test_thermal_coupling_nan_isolated():
+    # A device outside the model range (Ndisc<=0 -> NaN) must not spread NaN to its neighbours
+    Ndisc = np.linspace(0.5, 5, 9)
+    Ndisc[4] = -1
+    K = vns.thermal_coupling_grid(3, 3, 0.1, 0.02)
+    for dtype in (None, np.float32):
+        g = vns.dNdisc_dt_test(np.array([-0.8]), Ndisc, 45e-9, 0.4, 4e-3, 22, dtype=dtype, coupling=K)
+        np.testing.assert_array_equal(np.isnan(g), np.arange(9) == 4)
+
+
+def test_thermal_coupling_simulate():
+    pul = vns.pulse(p_form='DC', V_dc=-0.6)
+    K = vns.thermal_coupling_grid(2, 2, 0.1, 0.02)
+    lvar = [0.38, 0.40, 0.40, 0.42]
+    t_eval = np.linspace(0, 2e-3, 21)
+    iso = vns.simulate(pul, [0, 2e-3], 0.010, 45e-9, lvar, 4e-3, 22, method='RK45', rtol=1e-6, t_eval=t_eval)
+    cpl = vns.simulate(pul, [0, 2e-3], 0.010, 45e-9, lvar, 4e-3, 22, coupling=K, method='RK45', rtol=1e-6, t_eval=t_eval)
+    assert (iso.status, cpl.status) == (0, 0)
+    assert cpl.Ndisc.shape == cpl.I_mem.shape == (4, 21)
+    np.testing.assert_allclose(cpl.Ndisc[1], cpl.Ndisc[2], rtol=1e-12)     # Symmetric devices of the grid
+    assert np.all(cpl.Ndisc >= iso.Ndisc*(1 - 1e-9))                        # The neighbours speed up the SET
+    assert np.all(cpl.Ndisc[:, -1] > 10) and iso.Ndisc[3, -1] < 1
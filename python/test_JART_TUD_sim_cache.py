@@ -0,0 +1,87 @@
+############################ JART-TUD VCM device model ############################
+# Tests of the JART-TUD VCM Simulation Cache
+# Run from this folder with: python -m pytest -q
+###################################################################################
+import os
+import numpy as np
+import pytest
+import JART_TUD_VCM_lib as vns
+from JART_TUD_sim_cache import JART_TUD_sim_cache
+
+
+pul = vns.pulse(p_form='DC', V_dc=-0.6)
+solver = {'method': 'RK45', 'rtol': 1e-6}
+
+
+def test_cache_hit_mmap(tmp_path):
+    cache = JART_TUD_sim_cache(str(tmp_path))
+    miss = cache.simulate(pul, [0, 2e-3], 0.010, [42e-9, 45e-9], 0.4, 4e-3, 22, **solver)
+    hit = cache.simulate(pul, [0, 2e-3], 0.010, [42e-9, 45e-9], 0.4, 4e-3, 22, **solver)
+    assert (miss.cache_hit, hit.cache_hit) == (False, True)
+    assert (cache.n_misses, cache.n_hits) == (1, 1)
+    assert isinstance(hit.Ndisc, np.memmap)
+    for name in ('t', 'V_m', 'Ndisc', 'I_mem'):
+        np.testing.assert_array_equal(getattr(hit, name), getattr(miss, name))
+
+
+def test_cache_key(tmp_path):
+    cache = JART_TUD_sim_cache(str(tmp_path))
+    key = cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, **solver)
+    assert key == cache.key(vns.pulse(p_form='DC', V_dc=-0.6), [0, 2e-3], [0.010], [45e-9], [0.4], **solver)
+    assert key != cache.key(vns.pulse(p_form='DC', V_dc=-0.7), [0, 2e-3], 0.010, 45e-9, 0.4, **solver)
+    assert key != cache.key(pul, [0, 2e-3], 0.010, 46e-9, 0.4, **solver)
+    assert key != cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, method='RK45', rtol=1e-7)
+    key_32 = cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, dtype=np.float32, **solver)
+    assert key != key_32
+    assert key_32 == cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, dtype='float32', **solver)
+    assert key_32 == cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, dtype=np.dtype('float32'), **solver)
+    c = vns.calib_coefs('pos')
+    try:
+        vns.calib_load(c*1.01, 'pos')
+        assert key != cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, **solver)
+    finally:
+        vns.calib_load(c, 'pos')
+    assert key == cache.key(pul, [0, 2e-3], 0.010, 45e-9, 0.4, **solver)
+
+
+def test_cache_key_coupling(tmp_path):
+    cache = JART_TUD_sim_cache(str(tmp_path))
+    K = vns.thermal_coupling_grid(2, 2, 0.1, 0.02)
+    key = cache.key(pul, [0, 2e-3], 0.010, 45e-9, [0.38, 0.40, 0.40, 0.42], **solver)
+    key_K = cache.key(pul, [0, 2e-3], 0.010, 45e-9, [0.38, 0.40, 0.40, 0.42], coupling=K, **solver)
+    assert key != key_K
+    assert key_K == cache.key(pul, [0, 2e-3], 0.010, 45e-9, [0.38, 0.40, 0.40, 0.42], coupling=K.tocoo(), **solver)
+    assert key_K != cache.key(pul, [0, 2e-3], 0.010, 45e-9, [0.38, 0.40, 0.40, 0.42], coupling=2*K, **solver)
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = JART_TUD_sim_cache(str(tmp_path))
+    keys = []
+    for k, rvar in enumerate((42e-9, 45e-9, 48e-9)):
+        cache.simulate(pul, [0, 1e-3], 0.010, rvar, 0.4, 4e-3, 22, **solver)
+        keys.append(cache.key(pul, [0, 1e-3], 0.010, rvar, 0.4, 4e-3, 22, **solver))
+        os.utime(cache.path(keys[-1]), (k, k))     # Distinct access times
+    cache.load(keys[0])                             # The oldest entry becomes the most recently used
+    cache.max_bytes = sum(size for _, size, _ in cache.entries()) - 1
+    cache.evict()
+    assert not os.path.exists(cache.path(keys[1]))
+    assert os.path.exists(cache.path(keys[0])) and os.path.exists(cache.path(keys[2]))
+
+
+def test_cache_unsupported_outputs(tmp_path):
+    cache = JART_TUD_sim_cache(str(tmp_path))
+    with pytest.raises(TypeError):
+        cache.simulate(pul, [0, 1e-3], dense_output=True, **solver)
+    with pytest.raises(TypeError):
+        cache.simulate(pul, [0, 1e-3], events=lambda t, y: y[0] - 1, **solver)
+
+
+def test_cache_store_failure(tmp_path, monkeypatch):
+    # A failed write must not leave temporary files behind (they are not counted by evict())
+    cache = JART_TUD_sim_cache(str(tmp_path))
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(np, 'save', fail)
+    with pytest.raises(OSError):
+        cache.store('0'*64, np.zeros((4, 10)))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,116 @@
+############################ JART-TUD VCM device model ############################
+# Tests of the JART-TUD VCM Simulation Server
+# Run from this folder with: python -m pytest -q
+###################################################################################
+import asyncio
+import json
+import numpy as np
+import pytest
+import JART_TUD_VCM_lib as vns
+from JART_TUD_sim_server import JART_TUD_sim_server, async_request
+
+
+def serve(client, **server_kwargs):
+    # Runs the client coroutine against a server on a free localhost port
+    async def main():
+        server = JART_TUD_sim_server(port=0, batch_window=20e-3, **server_kwargs)
+        await server.start()
+        try:
+            return server, await client(server.port)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_server_Imem_batching():
+    rng = np.random.default_rng(0)
+    reqs = [{'id': k, 'op': 'Imem', 'V_m': rng.uniform(-1.3, 1.3, 5).tolist(), 'Ndisc': rng.uniform(0.01, 20, 5).tolist(),
+             'rvar': 42e-9 + k*1e-9, 'lvar': 0.4} for k in range(8)]
+
+    async def client(port):
+        return await asyncio.gather(*(async_request(req, port=port) for req in reqs))
+    server, results = serve(client)
+
+    assert server.n_requests == 8
+    assert server.n_batches < 8     # Concurrent requests are coalesced
+    for req, result in zip(reqs, results):
+        np.testing.assert_allclose(result['I_mem'], vns.Imem(np.array(req['V_m']), np.array(req['Ndisc']), req['rvar'], req['lvar']))
+
+
+def test_server_simulate_batching():
+    pul = {'p_form': 'DC', 'V_dc': -0.6}
+    solver = {'method': 'RK45', 'rtol': 1e-6}
+    reqs = [{'op': 'simulate', 'pulse': pul, 't_span': [0, 2e-3], 'rvar': rvar, 'lvar': 0.4, 'Ndiscmin': 4e-3, 'Ndiscmax': 22,
+             'solver': solver, 'batch': True} for rvar in (42e-9, [45e-9, 48e-9])]
+
+    async def client(port):
+        return await asyncio.gather(*(async_request(req, port=port) for req in reqs))
+    server, results = serve(client)
+
+    assert server.n_batches == 1
+    assert [len(result['Ndisc']) for result in results] == [1, 2]
+    sol = vns.simulate(vns.pulse(**pul), [0, 2e-3], 0.010, [42e-9, 45e-9, 48e-9], 0.4, 4e-3, 22, **solver)
+    np.testing.assert_allclose(results[0]['Ndisc'][0] + results[1]['Ndisc'][0] + results[1]['Ndisc'][1], np.concatenate(sol.Ndisc))
+
+
+def test_server_errors():
+    good = {'op': 'Imem', 'V_m': [-1.0], 'Ndisc': [1.0]}
+    bad = {'op': 'Imem', 'V_m': [-1.0, 1.0, 0.5], 'Ndisc': [1.0, 2.0]}     # Shapes do not broadcast
+
+    async def client(port):
+        return await asyncio.gather(async_request(good, port=port), async_request(bad, port=port),
+                                    async_request({'op': 'Isomething'}, port=port), return_exceptions=True)
+    _, results = serve(client)
+
+    np.testing.assert_allclose(results[0]['I_mem'], vns.Imem(np.array([-1.0]), np.array([1.0])))
+    assert isinstance(results[1], RuntimeError)
+    with pytest.raises(RuntimeError, match='Invalid op'):
+        raise results[2]
+
+
+def test_server_simulate_unbatched():
+    # Without "batch": true every simulate request is solved on its own, as a direct call of simulate()
+    pul = {'p_form': 'DC', 'V_dc': -0.6}
+    solver = {'method': 'RK45', 'rtol': 1e-6}
+    reqs = [{'op': 'simulate', 'pulse': pul, 't_span': [0, 2e-3], 'rvar': rvar, 'lvar': 0.4, 'Ndiscmin': 4e-3, 'Ndiscmax': 22,
+             'solver': solver} for rvar in (42e-9, 48e-9)]
+
+    async def client(port):
+        return await asyncio.gather(*(async_request(req, port=port) for req in reqs))
+    server, results = serve(client)
+
+    assert server.n_batches == 2
+    for req, result in zip(reqs, results):
+        sol = vns.simulate(vns.pulse(**pul), [0, 2e-3], 0.010, req['rvar'], 0.4, 4e-3, 22, **solver)
+        np.testing.assert_array_equal(result['t'], sol.t)
+        np.testing.assert_array_equal(result['Ndisc'], sol.Ndisc)
+
+
+def test_server_large_messages():
+    # Request and response lines longer than the default 64 KiB limit of asyncio streams
+    V_m = np.linspace(-1.3, 1.3, 5000)
+    req = {'op': 'Imem', 'V_m': V_m.tolist(), 'Ndisc': 1.0}
+    assert len(json.dumps(req)) > 2**16
+
+    async def client(port):
+        return await async_request(req, port=port)
+    _, result = serve(client)
+
+    assert len(json.dumps(result)) > 2**16
+    np.testing.assert_allclose(result['I_mem'], vns.Imem(V_m, np.ones(5000)))
+
+
+def test_server_line_too_long():
+    async def client(port):
+        return await async_request({'op': 'Imem', 'V_m': [-1.0]*1000, 'Ndisc': 1.0}, port=port)
+    with pytest.raises(RuntimeError, match='max_line'):
+        serve(client, max_line=1024)
+
+
+def test_server_stop_open_connection(caplog):
+    # stop() closes idle client connections without cancelling their handlers
+    async def client(port):
+        await async_request({'op': 'Imem', 'V_m': [-1.0], 'Ndisc': [1.0]}, port=port)
+        return await asyncio.open_connection('127.0.0.1', port)
+    serve(client)
+    assert not [record for record in caplog.records if record.name == 'asyncio']